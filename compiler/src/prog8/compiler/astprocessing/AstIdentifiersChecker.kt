@@ -16,6 +16,11 @@ import prog8.compiler.target.ICompilationTarget
 
 internal class AstIdentifiersChecker(private val program: Program, private val errors: IErrorReporter, private val compTarget: ICompilationTarget) : IAstVisitor {
     private var blocks = mutableMapOf<String, Block>()
+    private val libraryBlockNames by lazy {
+        program.modules
+                .filter { it.isLibraryModule }
+                .flatMapTo(mutableSetOf()) { it.statements.filterIsInstance<Block>().map { b -> b.name } }
+    }
 
     private fun nameError(name: String, position: Position, existing: Statement) {
         errors.err("name conflict '$name', also defined in ${existing.position.file} line ${existing.position.line}", position)
@@ -37,12 +42,8 @@ internal class AstIdentifiersChecker(private val program: Program, private val e
         else
             blocks[block.name] = block
 
-        if(!block.isInLibrary) {
-            val libraries = program.modules.filter { it.isLibraryModule }
-            val libraryBlockNames = libraries.flatMap { it.statements.filterIsInstance<Block>().map { b -> b.name } }
-            if(block.name in libraryBlockNames)
-                errors.err("block is already defined in an included library module", block.position)
-        }
+        if(!block.isInLibrary && block.name in libraryBlockNames)
+            errors.err("block is already defined in an included library module", block.position)
 
         super.visit(block)
     }
@@ -68,7 +68,7 @@ internal class StatementReorderer(val program: Program, val errors: IErrorReport
 
     override fun before(subroutine: Subroutine, parent: Node): Iterable<IAstModification> {
         if(subroutine.name=="start" && parent is Block) {
-            if(parent.statements.filterIsInstance<Subroutine>().first().name!="start") {
+            if(parent.statements.asSequence().filterIsInstance<Subroutine>().first().name!="start") {
                 return listOf(
                         IAstModification.Remove(subroutine, parent),
                         IAstModification.InsertFirst(subroutine, parent)
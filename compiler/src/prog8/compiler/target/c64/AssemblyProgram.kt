@@ -7,6 +7,14 @@ import prog8.compiler.target.generatedLabelPrefix
 import java.nio.file.Path
 import kotlin.system.exitProcess
 
+private val generatedLabelRx = Regex("""al (\w+) \S+${generatedLabelPrefix}.+?""")
+private val breakpointRx = Regex("""al (\w+) \S+_prog8_breakpoint_\d+.?""")      // gather breakpoints by the source label that's generated for them
+
+// add "-Wlong-branch"  to see warnings about conversion of branch instructions to jumps (default = do this silently)
+private val assemblerBaseArgs = listOf("64tass", "--ascii", "--case-sensitive", "--long-branch",
+        "-Wall", "-Wno-strict-bool", "-Wno-shadow", // "-Werror",
+        "--dump-labels", "--vice-labels")
+
 class AssemblyProgram(override val name: String, outputDir: Path, private val compTarget: String) : IAssemblyProgram {
     private val assemblyFile = outputDir.resolve("$name.asm")
     private val prgFile = outputDir.resolve("$name.prg")
@@ -14,10 +22,10 @@ class AssemblyProgram(override val name: String, outputDir: Path, private val co
     private val viceMonListFile = outputDir.resolve("$name.vice-mon-list")
 
     override fun assemble(options: CompilationOptions) {
-        // add "-Wlong-branch"  to see warnings about conversion of branch instructions to jumps (default = do this silently)
-        val command = mutableListOf("64tass", "--ascii", "--case-sensitive", "--long-branch",
-                "-Wall", "-Wno-strict-bool", "-Wno-shadow", // "-Werror",
-                "--dump-labels", "--vice-labels", "-l", viceMonListFile.toString(), "--no-monitor")
+        val command = assemblerBaseArgs.toMutableList()
+        command.add("-l")
+        command.add(viceMonListFile.toString())
+        command.add("--no-monitor")
 
         val outFile = when (options.output) {
             OutputType.PRG -> {
@@ -45,11 +53,10 @@ class AssemblyProgram(override val name: String, outputDir: Path, private val co
     }
 
     private fun removeGeneratedLabelsFromMonlist() {
-        val pattern = Regex("""al (\w+) \S+${generatedLabelPrefix}.+?""")
         val lines = viceMonListFile.toFile().readLines()
         viceMonListFile.toFile().outputStream().bufferedWriter().use {
             for (line in lines) {
-                if(pattern.matchEntire(line)==null)
+                if(generatedLabelRx.matchEntire(line)==null)
                     it.write(line+"\n")
             }
         }
@@ -58,16 +65,19 @@ class AssemblyProgram(override val name: String, outputDir: Path, private val co
     private fun generateBreakpointList() {
         // builds list of breakpoints, appends to monitor list file
         val breakpoints = mutableListOf<String>()
-        val pattern = Regex("""al (\w+) \S+_prog8_breakpoint_\d+.?""")      // gather breakpoints by the source label that's generated for them
-        for (line in viceMonListFile.toFile().readLines()) {
-            val match = pattern.matchEntire(line)
-            if (match != null)
-                breakpoints.add("break \$" + match.groupValues[1])
+        viceMonListFile.toFile().useLines { lines ->
+            for (line in lines) {
+                if ("_prog8_breakpoint_" !in line)
+                    continue    // cheap check first, most lines are not breakpoints
+                val match = breakpointRx.matchEntire(line)
+                if (match != null)
+                    breakpoints.add("break \$" + match.groupValues[1])
+            }
         }
-        val num = breakpoints.size
-        breakpoints.add(0, "; vice monitor breakpoint list now follows")
-        breakpoints.add(1, "; $num breakpoints have been defined")
-        breakpoints.add(2, "del")
-        viceMonListFile.toFile().appendText(breakpoints.joinToString("\n") + "\n")
+        val header = listOf(
+                "; vice monitor breakpoint list now follows",
+                "; ${breakpoints.size} breakpoints have been defined",
+                "del")
+        viceMonListFile.toFile().appendText((header + breakpoints).joinToString("\n") + "\n")
     }
 }
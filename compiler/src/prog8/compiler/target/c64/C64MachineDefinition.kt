@@ -155,19 +155,11 @@ internal object C64MachineDefinition: IMachineDefinition {
                     return zero
 
                 val sign = if (flt < 0.0) 0x80L else 0x00L
-                var exponent = 128 + 32    // 128 is cbm's bias, 32 is this algo's bias
-                var mantissa = flt.absoluteValue
-
-                // if mantissa is too large, shift right and adjust exponent
-                while (mantissa >= 0x100000000) {
-                    mantissa /= 2.0
-                    exponent++
-                }
-                // if mantissa is too small, shift left and adjust exponent
-                while (mantissa < 0x80000000) {
-                    mantissa *= 2.0
-                    exponent--
-                }
+                // normalize the mantissa into 0x80000000..0xffffffff in one step,
+                // by shifting it over the binary exponent and adjusting our exponent accordingly
+                val shift = 31 - Math.getExponent(flt)
+                val mantissa = Math.scalb(flt.absoluteValue, shift)
+                val exponent = 128 + 32 - shift    // 128 is cbm's bias, 32 is this algo's bias
 
                 return when {
                     exponent < 0 -> zero  // underflow, use zero instead
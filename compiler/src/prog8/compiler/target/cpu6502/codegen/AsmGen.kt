@@ -14,6 +14,7 @@ import prog8.compiler.target.c64.Petscii
 import prog8.compiler.target.cpu6502.codegen.assignment.AsmAssignment
 import prog8.compiler.target.cpu6502.codegen.assignment.AssignmentAsmGen
 import java.io.CharConversionException
+import java.io.File
 import java.nio.file.Path
 import java.nio.file.Paths
 import java.time.LocalDate
@@ -22,6 +23,8 @@ import java.util.*
 import kotlin.math.absoluteValue
 
 
+private val hexBytes = Array(256) { "$" + it.toString(16).padStart(2, '0') }      // "$00".."$ff"
+
 internal class AsmGen(private val program: Program,
                       val errors: IErrorReporter,
                       val zeropage: Zeropage,
@@ -47,6 +50,7 @@ internal class AsmGen(private val program: Program,
     private val blockLevelVarInits = mutableMapOf<Block, MutableSet<VarDecl>>()
     internal val slabs = mutableMapOf<String, Int>()
     internal val removals = mutableListOf<Pair<Statement, INameScope>>()
+    private var allBlocks = emptyList<Block>()
 
     override fun compileToAssembly(): IAssemblyProgram {
         assemblyLines.clear()
@@ -55,10 +59,10 @@ internal class AsmGen(private val program: Program,
         println("Generating assembly code... ")
 
         header()
-        val allBlocks = program.allBlocks()
+        allBlocks = program.allBlocks()
         if(allBlocks.first().name != "main")
             throw AssemblyError("first block should be 'main'")
-        for(b in program.allBlocks())
+        for(b in allBlocks)
             block2asm(b)
 
         for(removal in removals.toList()) {
@@ -70,25 +74,29 @@ internal class AsmGen(private val program: Program,
         footer()
 
         val outputFile = outputDir.resolve("${program.name}.asm").toFile()
-        outputFile.printWriter().use {
-            for (line in assemblyLines) { it.println(line) }
-        }
+        writeAssemblyLines(outputFile)
 
         if(options.optimize) {
+            // the optimizer works per line, so split up the multi-line fragments (inline asm, included files) first
+            val lines = assemblyLines.flatMap { it.lines() }
             assemblyLines.clear()
-            assemblyLines.addAll(outputFile.readLines())
+            assemblyLines.addAll(lines)
             var optimizationsDone = 1
             while (optimizationsDone > 0) {
                 optimizationsDone = optimizeAssembly(assemblyLines)
             }
-            outputFile.printWriter().use {
-                for (line in assemblyLines) { it.println(line) }
-            }
+            writeAssemblyLines(outputFile)
         }
 
         return AssemblyProgram(program.name, outputDir, compTarget.name)
     }
 
+    private fun writeAssemblyLines(outputFile: File) {
+        // one single write of the whole text instead of a println() call per line
+        val separator = System.lineSeparator()
+        outputFile.writeText(assemblyLines.joinToString(separator, postfix = separator))
+    }
+
     internal fun isTargetCpu(cpu: CpuType) = compTarget.machine.cpu == cpu
     internal fun haveFPWR() = compTarget is Cx16Target
 
@@ -171,31 +179,33 @@ internal class AsmGen(private val program: Program,
     private fun footer() {
         // the global list of all floating point constants for the whole program
         out("; global float constants")
-        for (flt in globalFloatConsts) {
-            val floatFill = compTarget.machine.getFloat(flt.key).makeFloatFillAsm()
-            val floatvalue = flt.key
-            out("${flt.value}\t.byte  $floatFill  ; float $floatvalue")
+        globalFloatConsts.mapTo(assemblyLines) { (floatvalue, name) ->
+            val floatFill = compTarget.machine.getFloat(floatvalue).makeFloatFillAsm()
+            "$name\t.byte  $floatFill  ; float $floatvalue"
         }
         out("prog8_program_end\t; end of program label for progend()")
     }
 
     private fun block2asm(block: Block) {
         out("\n\n; ---- block: '${block.name}' ----")
+        val blockOptions = block.options()
+        val forceOutput = "force_output" in blockOptions
         if(block.address!=null)
             out("* = ${block.address!!.toHex()}")
         else {
-            if("align_word" in block.options())
+            if("align_word" in blockOptions)
                 out("\t.align 2")
-            else if("align_page" in block.options())
+            else if("align_page" in blockOptions)
                 out("\t.align $100")
         }
 
-        out("${block.name}\t" + (if("force_output" in block.options()) ".block\n" else ".proc\n"))
+        out("${block.name}\t" + (if(forceOutput) ".block\n" else ".proc\n"))
 
         outputSourceLine(block)
-        zeropagevars2asm(block.statements)
-        memdefs2asm(block.statements)
-        vardecls2asm(block.statements)
+        val vardecls = block.statements.filterIsInstance<VarDecl>()
+        zeropagevars2asm(vardecls)
+        memdefs2asm(vardecls, block.statements)
+        vardecls2asm(vardecls)
         out("\n; subroutines in this block")
 
         // first translate regular statements, and then put the subroutines at the end.
@@ -205,9 +215,10 @@ internal class AsmGen(private val program: Program,
 
         // if any global vars need to be initialized, generate a subroutine that does this
         // it will be called from program init.
-        if(block in blockLevelVarInits) {
+        val varInits = blockLevelVarInits[block]
+        if(varInits!=null) {
             out("prog8_init_vars\t.proc\n")
-            blockLevelVarInits.getValue(block).forEach { decl ->
+            varInits.forEach { decl ->
                 val scopedFullName = decl.makeScopedName(decl.name).split('.')
                 require(scopedFullName.first()==block.name)
                 assignInitialValueToVar(decl, scopedFullName.drop(1))
@@ -215,7 +226,7 @@ internal class AsmGen(private val program: Program,
             out("  rts\n  .pend")
         }
 
-        out(if("force_output" in block.options()) "\n\t.bend\n" else "\n\t.pend\n")
+        out(if(forceOutput) "\n\t.bend\n" else "\n\t.pend\n")
     }
 
     private fun assignInitialValueToVar(decl: VarDecl, variableName: List<String>) {
@@ -238,14 +249,21 @@ internal class AsmGen(private val program: Program,
         val fragment = (if(" | " in str) str.replace("|", "\n") else str).trim('\n')
 
         if (splitlines) {
+            if('\n' !in fragment) {
+                // most fragments are just a single line, don't split those
+                assemblyLines.add(indentLine(fragment))
+                return
+            }
             for (line in fragment.split('\n')) {
-                val trimmed = if (line.startsWith(' ')) "\t" + line.trim() else line.trim()
+                val trimmed = indentLine(line)
                 // trimmed = trimmed.replace(Regex("^\\+\\s+"), "+\t")  // sanitize local label indentation
                 assemblyLines.add(trimmed)
             }
         } else assemblyLines.add(fragment)
     }
 
+    private fun indentLine(line: String) = if (line.startsWith(' ')) "\t" + line.trim() else line.trim()
+
     private fun encode(str: String, altEncoding: Boolean): List<Short> {
         try {
             val bytes = if (altEncoding) Petscii.encodeScreencode(str, true) else Petscii.encodePetscii(str, true)
@@ -255,9 +273,9 @@ internal class AsmGen(private val program: Program,
         }
     }
 
-    private fun zeropagevars2asm(statements: List<Statement>) {
+    private fun zeropagevars2asm(vardecls: List<VarDecl>) {
         out("; vars allocated on zeropage")
-        val variables = statements.filterIsInstance<VarDecl>().filter { it.type==VarDeclType.VAR }
+        val variables = vardecls.filter { it.type==VarDeclType.VAR }
         for(variable in variables) {
             val fullName = variable.makeScopedName(variable.name)
             val zpVar = allocatedZeropageVariables[fullName]
@@ -268,9 +286,7 @@ internal class AsmGen(private val program: Program,
                         && variable.datatype != DataType.FLOAT
                         && options.zeropage != ZeropageType.DONTUSE) {
                     try {
-                        val errors = ErrorReporter()
                         val address = zeropage.allocate(fullName, variable.datatype, null, errors)
-                        errors.report()
                         out("${variable.name} = $address\t; auto zp ${variable.datatype}")
                         // make sure we add the var to the set of zpvars for this block
                         allocatedZeropageVariables[fullName] = address to variable.datatype
@@ -295,46 +311,10 @@ internal class AsmGen(private val program: Program,
                 val str = decl.value as StringLiteralValue
                 outputStringvar(decl, encode(str.value, str.altEncoding))
             }
-            DataType.ARRAY_UB -> {
-                val data = makeArrayFillDataUnsigned(decl)
-                if (data.size <= 16)
-                    out("$name\t.byte  ${data.joinToString()}")
-                else {
-                    out(name)
-                    for (chunk in data.chunked(16))
-                        out("  .byte  " + chunk.joinToString())
-                }
-            }
-            DataType.ARRAY_B -> {
-                val data = makeArrayFillDataSigned(decl)
-                if (data.size <= 16)
-                    out("$name\t.char  ${data.joinToString()}")
-                else {
-                    out(name)
-                    for (chunk in data.chunked(16))
-                        out("  .char  " + chunk.joinToString())
-                }
-            }
-            DataType.ARRAY_UW -> {
-                val data = makeArrayFillDataUnsigned(decl)
-                if (data.size <= 16)
-                    out("$name\t.word  ${data.joinToString()}")
-                else {
-                    out(name)
-                    for (chunk in data.chunked(16))
-                        out("  .word  " + chunk.joinToString())
-                }
-            }
-            DataType.ARRAY_W -> {
-                val data = makeArrayFillDataSigned(decl)
-                if (data.size <= 16)
-                    out("$name\t.sint  ${data.joinToString()}")
-                else {
-                    out(name)
-                    for (chunk in data.chunked(16))
-                        out("  .sint  " + chunk.joinToString())
-                }
-            }
+            DataType.ARRAY_UB -> outputArrayData(name, ".byte", makeArrayFillDataUnsigned(decl))
+            DataType.ARRAY_B -> outputArrayData(name, ".char", makeArrayFillDataSigned(decl))
+            DataType.ARRAY_UW -> outputArrayData(name, ".word", makeArrayFillDataUnsigned(decl))
+            DataType.ARRAY_W -> outputArrayData(name, ".sint", makeArrayFillDataSigned(decl))
             DataType.ARRAY_F -> {
                 val array =
                         if(decl.value!=null)
@@ -344,20 +324,19 @@ internal class AsmGen(private val program: Program,
                             val zero = decl.zeroElementValue()
                             Array(decl.arraysize!!.constIndex()!!) { zero }
                         }
-                val floatFills = array.map {
+                out(name)
+                array.mapTo(assemblyLines) {
                     val number = (it as NumericLiteralValue).number
-                    compTarget.machine.getFloat(number).makeFloatFillAsm()
+                    val floatFill = compTarget.machine.getFloat(number).makeFloatFillAsm()
+                    "\t.byte  $floatFill  ; float $it"
                 }
-                out(name)
-                for (f in array.zip(floatFills))
-                    out("  .byte  ${f.second}  ; float ${f.first}")
             }
         }
     }
 
-    private fun memdefs2asm(statements: List<Statement>) {
+    private fun memdefs2asm(vardecls: List<VarDecl>, statements: List<Statement>) {
         out("\n; memdefs and kernal subroutines")
-        val memvars = statements.filterIsInstance<VarDecl>().filter { it.type==VarDeclType.MEMORY || it.type==VarDeclType.CONST }
+        val memvars = vardecls.filter { it.type==VarDeclType.MEMORY || it.type==VarDeclType.CONST }
         for(m in memvars) {
             if(m.value is NumericLiteralValue)
                 out("  ${m.name} = ${(m.value as NumericLiteralValue).number.toHex()}")
@@ -375,44 +354,64 @@ internal class AsmGen(private val program: Program,
         }
     }
 
-    private fun vardecls2asm(statements: List<Statement>) {
+    private fun vardecls2asm(vardecls: List<VarDecl>) {
         out("\n; non-zeropage variables")
-        val vars = statements.filterIsInstance<VarDecl>().filter { it.type==VarDeclType.VAR }
 
         // first output the flattened struct member variables *in order*
-        // after that, the other variables sorted by their datatype
+        // after that, the other variables sorted by their datatype.
+        // the variables are distributed over these groups in a single pass.
+
+        val structMembers = mutableListOf<VarDecl>()
+        val encodedstringVars = mutableMapOf<List<Short>, MutableList<VarDecl>>()
+        val varsPerDatatype = mutableMapOf<DataType, MutableList<VarDecl>>()
+        for(decl in vardecls) {
+            if(decl.type!=VarDeclType.VAR)
+                continue
+            when {
+                decl.struct!=null -> structMembers.add(decl)
+                decl.datatype==DataType.STR -> {
+                    // special treatment for string types: merge strings that are identical
+                    val str = decl.value as StringLiteralValue
+                    encodedstringVars.getOrPut(encode(str.value, str.altEncoding)) { mutableListOf() }.add(decl)
+                }
+                decl.makeScopedName(decl.name) !in allocatedZeropageVariables ->
+                    varsPerDatatype.getOrPut(decl.datatype) { mutableListOf() }.add(decl)
+            }
+        }
 
-        val (structMembers, normalVars) = vars.partition { it.struct!=null }
         structMembers.forEach { vardecl2asm(it) }
 
-        // special treatment for string types: merge strings that are identical
-        val encodedstringVars = normalVars
-                .filter {it.datatype == DataType.STR }
-                .map {
-                    val str = it.value as StringLiteralValue
-                    it to encode(str.value, str.altEncoding)
-                }
-                .groupBy({it.second}, {it.first})
         for((encoded, variables) in encodedstringVars) {
             variables.dropLast(1).forEach { out(it.name) }
             val lastvar = variables.last()
             outputStringvar(lastvar, encoded)
         }
 
-        // non-string variables
-        normalVars.filter{ it.datatype != DataType.STR }.sortedBy { it.datatype }.forEach {
-            if(it.makeScopedName(it.name) !in allocatedZeropageVariables)
-                vardecl2asm(it)
-        }
+        // non-string variables, going over the datatypes in order means they don't have to be sorted
+        for(dt in DataType.values())
+            varsPerDatatype[dt]?.forEach { vardecl2asm(it) }
     }
 
     private fun outputStringvar(lastvar: VarDecl, encoded: List<Short>) {
         val sv = lastvar.value as StringLiteralValue
         val altEncoding = if(sv.altEncoding) "@" else ""
         out("${lastvar.name}\t; ${lastvar.datatype} $altEncoding\"${escape(sv.value).replace("\u0000", "<NULL>")}\"")
-        val outputBytes = encoded.map { "$" + it.toString(16).padStart(2, '0') }
-        for (chunk in outputBytes.chunked(16))
-            out("  .byte  " + chunk.joinToString())
+        val outputBytes = encoded.map { hexBytes[it.toInt()] }
+        outputDataChunks(".byte", outputBytes)
+    }
+
+    private fun outputArrayData(name: String, directive: String, data: List<String>) {
+        if (data.size <= 16)
+            out("$name\t$directive  ${data.joinToString()}")
+        else {
+            out(name)
+            outputDataChunks(directive, data)
+        }
+    }
+
+    private fun outputDataChunks(directive: String, data: List<String>) {
+        // the data lines are already properly formatted, add them directly without going through out()
+        data.chunked(16).mapTo(assemblyLines) { "\t$directive  " + it.joinToString() }
     }
 
     private fun makeArrayFillDataUnsigned(decl: VarDecl): List<String> {
@@ -845,15 +844,16 @@ internal class AsmGen(private val program: Program,
         } else {
             // regular subroutine
             out("${sub.name}\t.proc")
-            zeropagevars2asm(sub.statements)
-            memdefs2asm(sub.statements)
+            val vardecls = sub.statements.filterIsInstance<VarDecl>()
+            zeropagevars2asm(vardecls)
+            memdefs2asm(vardecls, sub.statements)
 
             // the main.start subroutine is the program's entrypoint and should perform some initialization logic
             if(sub.name=="start" && sub.definingBlock().name=="main") {
                 out("; program startup initialization")
                 out("  cld")
-                program.allBlocks().forEach {
-                    if(it.statements.filterIsInstance<VarDecl>().any { vd->vd.value!=null && vd.type==VarDeclType.VAR && vd.datatype in NumericDatatypes})
+                allBlocks.forEach {
+                    if(it.statements.any { vd -> vd is VarDecl && vd.value!=null && vd.type==VarDeclType.VAR && vd.datatype in NumericDatatypes})
                         out("  jsr  ${it.name}.prog8_init_vars")
                 }
                 out("""
@@ -886,7 +886,7 @@ internal class AsmGen(private val program: Program,
                 out("$subroutineFloatEvalResultVar1    .byte 0,0,0,0,0")
             if(sub.asmGenInfo.usedFloatEvalResultVar2)
                 out("$subroutineFloatEvalResultVar2    .byte 0,0,0,0,0")
-            vardecls2asm(sub.statements)
+            vardecls2asm(vardecls)
             out("  .pend\n")
         }
     }
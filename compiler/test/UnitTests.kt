@@ -6,6 +6,8 @@ import org.hamcrest.Matchers.equalTo
 import org.junit.jupiter.api.Test
 import org.junit.jupiter.api.TestInstance
 import prog8.ast.*
+import prog8.ast.antlr.escape
+import prog8.ast.antlr.unescape
 import prog8.ast.base.DataType
 import prog8.ast.base.ParentSentinel
 import prog8.ast.base.Position
@@ -59,6 +61,17 @@ class TestCompiler {
         assertFailsWith<IllegalArgumentException> { 65536L.toHex()  }
     }
 
+    @Test
+    fun testEscapeUnescape() {
+        assertEquals("", escape(""))
+        assertEquals("hello world!", escape("hello world!"))
+        assertEquals("tab\\tnl\\ncr\\rquote\\\"", escape("tab\tnl\ncr\rquote\""))
+        assertEquals("\\x41\\u20ac", escape("\u8041\u20ac"))
+        assertEquals("hello world!", unescape("hello world!", Position.DUMMY))
+        assertEquals("nl\ncr\rquote\"", unescape("nl\\ncr\\rquote\\\"", Position.DUMMY))
+        assertEquals("\u8041\u20ac", unescape("\\x41\\u20ac", Position.DUMMY))
+    }
+
     @Test
     fun testFloatToMflpt5() {
         assertThat(Mflpt5.fromNumber(0), equalTo(Mflpt5(0x00, 0x00, 0x00, 0x00, 0x00)))
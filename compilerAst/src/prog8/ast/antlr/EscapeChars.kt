@@ -4,28 +4,32 @@ import prog8.ast.base.Position
 import prog8.ast.base.SyntaxError
 
 fun escape(str: String): String {
-    val es = str.map {
-        when(it) {
-            '\t' -> "\\t"
-            '\n' -> "\\n"
-            '\r' -> "\\r"
-            '"' -> "\\\""
-            in '\u8000'..'\u80ff' -> "\\x" + (it.toInt() - 0x8000).toString(16).padStart(2, '0')
-            in '\u0000'..'\u00ff' -> it.toString()
-            else -> "\\u" + it.toInt().toString(16).padStart(4, '0')
+    if(str.none { it=='\t' || it=='\n' || it=='\r' || it=='"' || it > '\u00ff' })
+        return str      // most strings don't contain anything that needs escaping
+
+    val es = StringBuilder(str.length)
+    for(c in str) {
+        when(c) {
+            '\t' -> es.append("\\t")
+            '\n' -> es.append("\\n")
+            '\r' -> es.append("\\r")
+            '"' -> es.append("\\\"")
+            in '\u8000'..'\u80ff' -> es.append("\\x").append((c.toInt() - 0x8000).toString(16).padStart(2, '0'))
+            in '\u0000'..'\u00ff' -> es.append(c)
+            else -> es.append("\\u").append(c.toInt().toString(16).padStart(4, '0'))
         }
     }
-    return es.joinToString("")
+    return es.toString()
 }
 
 fun unescape(str: String, position: Position): String {
-    val result = mutableListOf<Char>()
+    val result = StringBuilder(str.length)
     val iter = str.iterator()
     while(iter.hasNext()) {
         val c = iter.nextChar()
         if(c=='\\') {
             val ec = iter.nextChar()
-            result.add(when(ec) {
+            result.append(when(ec) {
                 '\\' -> '\\'
                 'n' -> '\n'
                 'r' -> '\r'
@@ -42,8 +46,8 @@ fun unescape(str: String, position: Position): String {
                 else -> throw SyntaxError("invalid escape char in string: \\$ec", position)
             })
         } else {
-            result.add(c)
+            result.append(c)
         }
     }
-    return result.joinToString("")
+    return result.toString()
 }